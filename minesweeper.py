@@ -1,7 +1,11 @@
 import itertools
 import random
 
-from typing import List, Set
+from collections import deque
+
+import numpy as np
+
+from typing import Dict, FrozenSet, List, Set, Tuple
 
 class Minesweeper():
     """
@@ -13,23 +17,20 @@ class Minesweeper():
         # Set initial width, height, and number of mines
         self.height = height
         self.width = width
-        self.mines = set()
 
         # Initialize an empty field with no mines
-        self.board = []
-        for i in range(self.height):
-            row = []
-            for j in range(self.width):
-                row.append(False)
-            self.board.append(row)
+        self.board: np.ndarray = np.zeros((height, width), dtype=np.uint8)
 
         # Add mines randomly
-        while len(self.mines) != mines:
-            i = random.randrange(height)
-            j = random.randrange(width)
-            if not self.board[i][j]:
-                self.mines.add((i, j))
-                self.board[i][j] = True
+        positions = random.sample(range(height * width), mines)
+        self.mines = {divmod(p, width) for p in positions}
+
+        # Mark the mines on the board, and in one bitmask per row with
+        # bit j set for a mine in column j
+        self._rowmasks: List[int] = [0] * height
+        for i, j in self.mines:
+            self.board[i, j] = 1
+            self._rowmasks[i] |= 1 << j
 
         # At first, player has found no mines
         self.mines_found = set()
@@ -39,19 +40,13 @@ class Minesweeper():
         Prints a text-based representation
         of where mines are located.
         """
-        for i in range(self.height):
+        for row in np.where(self.board, "X", " "):
             print("--" * self.width + "-")
-            for j in range(self.width):
-                if self.board[i][j]:
-                    print("|X", end="")
-                else:
-                    print("| ", end="")
-            print("|")
+            print("|" + "|".join(row) + "|")
         print("--" * self.width + "-")
 
     def is_mine(self, cell):
-        i, j = cell
-        return self.board[i][j]
+        return bool(self.board[cell])
 
     def nearby_mines(self, cell):
         """
@@ -59,24 +54,17 @@ class Minesweeper():
         within one row and column of a given cell,
         not including the cell itself.
         """
+        i, j = cell
 
-        # Keep count of nearby mines
-        count = 0
-
-        # Loop over all cells within one row and column
-        for i in range(cell[0] - 1, cell[0] + 2):
-            for j in range(cell[1] - 1, cell[1] + 2):
-
-                # Ignore the cell itself
-                if (i, j) == cell:
-                    continue
-
-                # Update count if cell in bounds and is mine
-                if 0 <= i < self.height and 0 <= j < self.width:
-                    if self.board[i][j]:
-                        count += 1
+        # Columns j-1..j+1; the right shift drops the bit below column 0
+        window = (0b111 << j) >> 1
 
-        return count
+        # Popcount the window in each row in bounds (bits past the last
+        # column are never set), then take the cell itself back out
+        count = 0
+        for row in self._rowmasks[max(0, i - 1):i + 2]:
+            count += (row & window).bit_count()
+        return count - self.is_mine(cell)
 
     def won(self):
         """
@@ -132,10 +120,67 @@ class Sentence():
         Updates internal knowledge representation given the fact that
         a cell is known to be safe.
         """
-        try:
-            self.cells.remove(cell)
-        except:
-            pass
+        self.cells.discard(cell)
+
+
+def _add_sentence(knowledge, index, cells, count):
+    """
+    Adds the sentence `cells = count` to a knowledge base mapping
+    cells to counts, and to its index from each cell to the sentences
+    holding it. Empty sentences are dropped, and a sentence already
+    in the knowledge base keeps its count.
+    Returns whether the sentence was new.
+    """
+    if not cells or cells in knowledge:
+        return False
+    knowledge[cells] = count
+    for cell in cells:
+        index.setdefault(cell, set()).add(cells)
+    return True
+
+
+def _remove_sentence(knowledge, index, cells):
+    """
+    Removes a sentence from a knowledge base and its cell index.
+    Returns the count of the removed sentence.
+    """
+    for cell in cells:
+        sentences = index.get(cell)
+        if sentences is not None:
+            sentences.discard(cells)
+            if not sentences:
+                del index[cell]
+    return knowledge.pop(cells)
+
+
+def _mark_mine(knowledge, index, cell):
+    """
+    Removes a cell known to be a mine from every sentence in a
+    knowledge base, lowering their counts.
+    Returns the rebuilt sentences as (cells, count) pairs.
+    """
+    changed = list()
+    for cells in index.pop(cell, ()):
+        count = _remove_sentence(knowledge, index, cells) - 1
+        cells = cells - {cell}
+        if _add_sentence(knowledge, index, cells, count):
+            changed.append((cells, count))
+    return changed
+
+
+def _mark_safe(knowledge, index, cell):
+    """
+    Removes a cell known to be safe from every sentence in a
+    knowledge base.
+    Returns the rebuilt sentences as (cells, count) pairs.
+    """
+    changed = list()
+    for cells in index.pop(cell, ()):
+        count = _remove_sentence(knowledge, index, cells)
+        cells = cells - {cell}
+        if _add_sentence(knowledge, index, cells, count):
+            changed.append((cells, count))
+    return changed
 
 
 class MinesweeperAI():
@@ -156,33 +201,89 @@ class MinesweeperAI():
         self.mines: set = set()
         self.safes: set = set()
 
-        # List of sentences about the game known to be true
-        self.knowledge: List[Sentence] = list()
+        # Safe cells that have not been clicked on yet
+        self._unplayed_safes: set = set()
+
+        # Cells that are neither clicked on nor known to be mines
+        self._available: set = set(itertools.product(range(height), range(width)))
+
+        # Sentences about the game known to be true, as cells -> count
+        self.knowledge: Dict[FrozenSet[Tuple[int, int]], int] = dict()
+
+        # Sentences in self.knowledge holding each cell
+        self._cell_to_sentences: Dict[Tuple[int, int], Set[FrozenSet[Tuple[int, int]]]] = dict()
+
+        # Sentences already compared with every other sentence for subset
+        # inference. A sentence only leaves self.knowledge when one of its
+        # cells becomes known, and a sentence holding a known cell is never
+        # stored again, so a removed key never comes back. Keys of removed
+        # sentences can therefore stay here without hiding any pair.
+        self._paired: Set[FrozenSet[Tuple[int, int]]] = set()
+
+        # In-bounds neighbors of every cell, computed once per board
+        self._neighbors: Dict[Tuple[int, int], FrozenSet[Tuple[int, int]]] = {
+            (i, j): frozenset(
+                (i + di, j + dj)
+                for di in (-1, 0, 1)
+                for dj in (-1, 0, 1)
+                if (di or dj) and 0 <= i + di < height and 0 <= j + dj < width
+            )
+            for i in range(height)
+            for j in range(width)
+        }
 
     def mark_mine(self, cell):
         """
         Marks a cell as a mine, and updates all knowledge
         to mark that cell as a mine as well.
+        Returns the sentences that changed.
         """
         self.mines.add(cell)
-        for sentence in self.knowledge:
-            sentence.mark_mine(cell)
+        self._available.discard(cell)
+        return _mark_mine(self.knowledge, self._cell_to_sentences, cell)
 
     def mark_safe(self, cell):
         """
         Marks a cell as safe, and updates all knowledge
         to mark that cell as safe as well.
+        Returns the sentences that changed.
         """
         self.safes.add(cell)
-        for sentence in self.knowledge:
-            sentence.mark_safe(cell)
+        if cell not in self.moves_made:
+            self._unplayed_safes.add(cell)
+        return _mark_safe(self.knowledge, self._cell_to_sentences, cell)
 
-    def is_cell_valid(self, cell) -> bool:
-        x, y = cell
-        if x < 0 or x >= self.height or y < 0 or y >= self.width:
-            return False
-        
-        return True
+    def _propagate(self, mines, safes):
+        """
+        Marks the given cells as mines and safes, then keeps marking
+        any cells that the changed sentences reveal, until nothing new
+        is learned. Only sentences touched by a new fact are re-checked.
+        Returns the sentences rebuilt along the way.
+        """
+        pending_mines = deque(mines)
+        pending_safes = deque(safes)
+        rebuilt = list()
+
+        while pending_mines or pending_safes:
+            if pending_mines:
+                cell = pending_mines.popleft()
+                if cell in self.mines:
+                    continue
+                changed = self.mark_mine(cell)
+            else:
+                cell = pending_safes.popleft()
+                if cell in self.safes:
+                    continue
+                changed = self.mark_safe(cell)
+
+            rebuilt.extend(changed)
+            for cells, count in changed:
+                if count == 0:
+                    pending_safes.extend(cells)
+                elif count == len(cells):
+                    pending_mines.extend(cells)
+
+        return rebuilt
 
     def add_knowledge(self, cell, count):
         """
@@ -202,71 +303,88 @@ class MinesweeperAI():
 
         # Mark the cell as a move that has been made
         self.moves_made.add(cell)
+        self._unplayed_safes.discard(cell)
+        self._available.discard(cell)
         # Mark the cell as safe
-        self.mark_safe(cell)
+        changed = self.mark_safe(cell)
 
         # Add new sentence to knowledgebase
-        x, y = cell
-        cells = set()
-        for i in range(-1, 2):
-            for j in range(-1, 2):
-                if self.is_cell_valid((x + i, y + j)):
-                    if (x + i, y + j) in self.mines:
-                        count -= 1
-                    elif (x + i, y + j) not in self.moves_made:
-                        cells.add((x + i, y + j))
-        
-        self.knowledge.append(Sentence(cells, count))
-
-        # Mark any additional cells as sage or as mines
-        for sentence in self.knowledge:
-            known_mines = sentence.known_mines()
-            for cell in known_mines:
-                self.mark_mine(cell)
-            known_safes = sentence.known_safes()
-            for cell in known_safes:
-                self.mark_safe(cell)
-
-        # Removes unwanted sets
-        length: int = len(self.knowledge)
-        i: int = 0
-        while i < length:
-            if len(self.knowledge[i].cells) == 0:
-                del self.knowledge[i]
-                length -= 1
-                continue
-
-            j = i
-            while j < length:
-                if not i == j:
-                    if self.knowledge[i].cells == self.knowledge[j].cells:
-                        del self.knowledge[j]
-                        length -= 1
-                        continue
-                
-                j += 1
-            i += 1
-
-        # Add any new sentences to the AI's knowledge base
-        new_knowledges: List[Sentence] = list()
-
-        for i, s1 in enumerate(self.knowledge):
-            s1_len = len(s1.cells)
-
-            if s1_len == 0:
-                continue
-            for j, s2 in enumerate(self.knowledge[i:]):
-                s2_len = len(s2.cells)
-                if s2_len == 0:
+        neighbors = self._neighbors[cell]
+        count -= len(neighbors & self.mines)
+        cells = neighbors - self.mines - self.safes
+
+        if _add_sentence(self.knowledge, self._cell_to_sentences, cells, count):
+            changed.append((cells, count))
+
+        # Mark any additional cells as safe or as mines. Every other
+        # sentence was already checked when it was stored or last changed,
+        # so only the ones changed by this move can reveal anything.
+        known_mines: Set[Tuple[int, int]] = set()
+        known_safes: Set[Tuple[int, int]] = set()
+        for cells, count in changed:
+            if count == 0:
+                known_safes |= cells
+            elif count == len(cells):
+                known_mines |= cells
+
+        changed.extend(self._propagate(known_mines, known_safes))
+
+        # Add any new sentences to the AI's knowledge base, repeating
+        # until a round infers nothing. Each round only pairs up the
+        # sentences stored since the previous one.
+        fresh = {cells for cells, _ in changed if cells in self.knowledge} - self._paired
+        while fresh:
+            self._paired |= fresh
+
+            new_knowledges = self._infer_from_subsets(fresh)
+
+            # Differences that are all safe or all mines are marked right
+            # away instead of being stored for a later round to resolve
+            added: List[Tuple[FrozenSet[Tuple[int, int]], int]] = list()
+            inferred_mines: Set[Tuple[int, int]] = set()
+            inferred_safes: Set[Tuple[int, int]] = set()
+            for cells, count in new_knowledges:
+                if count == 0:
+                    inferred_safes |= cells
+                elif count == len(cells):
+                    inferred_mines |= cells
+                elif _add_sentence(self.knowledge, self._cell_to_sentences, cells, count):
+                    added.append((cells, count))
+
+            added.extend(self._propagate(inferred_mines, inferred_safes))
+            fresh = {cells for cells, _ in added if cells in self.knowledge} - self._paired
+
+    def _infer_from_subsets(self, fresh) -> List[Tuple[FrozenSet[Tuple[int, int]], int]]:
+        """
+        Returns the sentences inferred from every pair of sentences
+        where one is a proper subset of the other, and at least one
+        of the two is in `fresh`.
+        """
+        new_knowledges: List[Tuple[FrozenSet[Tuple[int, int]], int]] = list()
+        by_cell = self._cell_to_sentences
+
+        for cells in fresh:
+            count = self.knowledge[cells]
+
+            # As the subset: every superset holds each of its cells, so
+            # only the sentences holding its rarest cell are probed
+            rarest = min(cells, key=lambda cell: len(by_cell[cell]))
+            for big_cells in by_cell[rarest]:
+                if len(big_cells) > len(cells) and cells <= big_cells:
+                    new_knowledges.append((big_cells - cells, self.knowledge[big_cells] - count))
+
+            # As the superset: every subset shares its cells. Fresh subsets
+            # were already probed above.
+            smaller = set()
+            for cell in cells:
+                smaller.update(by_cell[cell])
+            for small_cells in smaller:
+                if small_cells in fresh or len(small_cells) >= len(cells):
                     continue
-                if s1_len > s2_len and s2.cells.issubset(s1.cells):
-                    new_knowledges.append(Sentence(s1.cells.difference(s2.cells), s1.count - s2.count))   
-                elif s2_len > s1_len and s1.cells.issubset(s2.cells):
-                    new_knowledges.append(Sentence(s2.cells.difference(s1.cells), s2.count - s1.count))
-        
-        self.knowledge.extend(new_knowledges)
-
+                if small_cells <= cells:
+                    new_knowledges.append((cells - small_cells, count - self.knowledge[small_cells]))
 
+        return new_knowledges
 
     def make_safe_move(self):
         """
@@ -277,10 +395,7 @@ class MinesweeperAI():
         This function may use the knowledge in self.mines, self.safes
         and self.moves_made, but should not modify any of those values.
         """
-        
-        for safe_move in self.safes:
-            if safe_move not in self.moves_made:
-                return safe_move
+        return next(iter(self._unplayed_safes), None)
 
     def make_random_move(self):
         """
@@ -289,7 +404,6 @@ class MinesweeperAI():
             1) have not already been chosen, and
             2) are not known to be mines
         """
-        for i in range(0, self.height):
-            for j in range(0, self.width):
-                if (i, j) not in self.mines and (i, j) not in self.moves_made:
-                    return (i, j)
+        if not self._available:
+            return None
+        return random.choice(tuple(self._available))